@@ -1,28 +1,155 @@
+import os
 import sqlite3
+import threading
+import warnings
+import weakref
+from typing import Iterable
+
+import pandas as pd
 
 DB_NAME = 'cars.db'
 
-def insert_car(car):
-    with sqlite3.connect(DB_NAME) as conn:
-        cur = conn.cursor()
-        cur.execute('''
-            INSERT OR IGNORE INTO cars 
-            (ad_id, make, model, price, year, body_type, fuel, gearbox, engine_volume, engine_power, mileage)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', car)
-        conn.commit()
-
-def get_cars_by_make(make):
-    with sqlite3.connect(DB_NAME) as conn:
+# Connection-level tuning shared by every module that touches the database:
+# WAL lets Streamlit/training reads run alongside scraper writes, and NORMAL sync
+# only fsyncs at checkpoints instead of on every commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+# Browser scraping runs one writer process per brand, so a write waits this long for the lock
+# instead of failing at once with "database is locked".
+BUSY_TIMEOUT_SECONDS = 30
+
+def _apply_pragmas(conn):
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+
+def connect(check_same_thread: bool = True):
+    """Opens a connection to the cars database with the tuned PRAGMAs applied."""
+    conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=check_same_thread)
+    _apply_pragmas(conn)
+    return conn
+
+# One long-lived connection per thread, so repeated queries (e.g. Streamlit reruns)
+# reuse the open file and its warm page cache instead of reconnecting on every call.
+_local = threading.local()
+# Weak, so it never keeps a connection open; only used to find the live ones after fork().
+_holders = weakref.WeakSet()
+# Connections inherited across fork(). They are kept referenced, because closing them in the child
+# could checkpoint or remove the WAL file the parent is still using.
+_inherited_connections = []
+
+class _ConnectionHolder:
+    """Owns one thread's connection and closes it when the thread ends and its thread-local data is freed."""
+
+    def __init__(self):
+        # Closed from whichever thread frees the holder, or at interpreter exit.
+        self.conn = connect(check_same_thread=False)
+        self.finalizer = weakref.finalize(self, self.conn.close)
+
+def _get_conn():
+    holder = getattr(_local, 'holder', None)
+    if holder is None:
+        holder = _local.holder = _ConnectionHolder()
+        _holders.add(holder)
+    return holder.conn
+
+def _reset_connections_after_fork():
+    # An SQLite connection must not be used across fork(), so a forked child opens its own.
+    global _local
+    for holder in list(_holders):
+        holder.finalizer.detach()
+        _inherited_connections.append(holder.conn)
+    _holders.clear()
+    _local = threading.local()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_connections_after_fork)
+
+# Kept as a single module-level statement, so the pooled connection's statement cache compiles it
+# once and executemany runs the same prepared statement for every row of every batch.
+INSERT_CAR_SQL = '''
+    INSERT INTO cars 
+    (ad_id, make, model, price, year, body_type, fuel, gearbox, engine_volume, engine_power, mileage)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(ad_id) DO NOTHING
+'''
+
+def insert_cars(cars: Iterable[tuple]) -> int:
+    """
+    Inserts many car listings in a single transaction, so a whole batch costs one commit
+    instead of one per row. Listings whose ad_id already exists are skipped.
+    Any iterable works, so rows can be streamed from a generator without building a list.
+
+    Returns:
+        int: The number of rows actually inserted.
+    """
+    conn = _get_conn()
+    with conn:
         cur = conn.cursor()
-        cur.execute("SELECT * FROM cars WHERE make = ?", (make,))
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        return rows, columns
+        cur.execute("BEGIN")
+        cur.executemany(INSERT_CAR_SQL, cars)
+    return cur.rowcount
+
+def insert_car(car):
+    """Deprecated: use insert_cars() with a batch of listings instead."""
+    warnings.warn("insert_car() is deprecated, use insert_cars() instead.", DeprecationWarning, stacklevel=2)
+    insert_cars([car])
+
+def refresh_statistics():
+    """Refreshes the query planner's statistics (sqlite_stat1) after a bulk load, so per-make queries use the make index."""
+    _get_conn().execute("ANALYZE")
+
+def get_cars_df(make) -> pd.DataFrame:
+    """Loads all listings of a make straight into a typed DataFrame."""
+    return pd.read_sql_query("SELECT * FROM cars WHERE make = ?", _get_conn(), params=(make,))
 
 def get_all_car_makes():
-    with sqlite3.connect(DB_NAME) as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT DISTINCT make FROM cars WHERE make IS NOT NULL")
-            makes = [row[0] for row in cur.fetchall()]
-            return makes
\ No newline at end of file
+    cur = _get_conn().cursor()
+    cur.execute("SELECT DISTINCT make FROM cars WHERE make IS NOT NULL")
+    makes = [row[0] for row in cur.fetchall()]
+    return makes
+
+def get_all_ad_ids() -> set:
+    """Returns the ad_id of every stored listing, read straight from the UNIQUE index on ad_id."""
+    return {row[0] for row in _get_conn().execute("SELECT ad_id FROM cars")}
+
+def get_all_cars_grouped() -> pd.DataFrame:
+    """Loads every listing with a known make in one query, ready to be split with groupby('make')."""
+    return pd.read_sql_query("SELECT * FROM cars WHERE make IS NOT NULL", _get_conn())
+
+# HTTP validators of scraped listing pages, used to skip pages that have not changed since the last run.
+CREATE_PAGE_CACHE_SQL = '''
+    CREATE TABLE IF NOT EXISTS page_cache (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT
+    )
+'''
+
+def get_page_validators() -> dict:
+    """
+    Returns the (etag, last_modified) pair stored for every previously scraped listing page, keyed by URL.
+    Creates the page_cache table first, so databases set up before it existed keep working.
+    """
+    conn = _get_conn()
+    with conn:
+        conn.execute(CREATE_PAGE_CACHE_SQL)
+    cur = conn.execute("SELECT url, etag, last_modified FROM page_cache")
+    return {url: (etag, last_modified) for url, etag, last_modified in cur}
+
+def save_page_validators(url: str, etag, last_modified):
+    """Stores the ETag and Last-Modified headers of a scraped page, so the next run can ask whether it changed."""
+    conn = _get_conn()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO page_cache (url, etag, last_modified) VALUES (?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified
+            """,
+            (url, etag, last_modified)
+        )
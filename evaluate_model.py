@@ -1,17 +1,23 @@
+import numpy as np
 import pandas as pd
-from sklearn.metrics import mean_absolute_error
+from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
 import os
-import logging
+from logging_setup import get_logger
 from db import get_all_car_makes
 
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    handlers=[
-                        logging.FileHandler("app_activity.log"),
-                        logging.StreamHandler()
-                    ])
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
+
+def smallest_indices(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the positions of the k smallest values in ascending order of value.
+    Partitions the array first, so only those k values are sorted instead of all of them.
+    """
+    if k < len(values):
+        indices = np.argpartition(values, k)[:k]
+    else:
+        indices = np.arange(len(values))
+    return indices[np.argsort(values[indices])]
 
 def evaluate_model(make):
     """
@@ -22,40 +28,41 @@ def evaluate_model(make):
     Args:
         make (str): The car make for which to evaluate the model (e.g., 'BMW').
     """
-    model_path = f'models/{make}_model.pkl'
+    serve_path = f'models/{make}_serve.pkl'
+    eval_path = f'models/{make}_eval.pkl'
     logger.info(f"Starting model evaluation for make: {make}")
 
-    if not os.path.exists(model_path):
-        logger.error(f"Model file not found for make: {make} at {model_path}. Cannot evaluate model.")
-        return
+    for path in (serve_path, eval_path):
+        if not os.path.exists(path):
+            logger.error(f"Model file not found for make: {make} at {path}. Cannot evaluate model.")
+            return
 
     try:
-        model_data = joblib.load(model_path)
+        model_data = joblib.load(serve_path)
+        eval_data = joblib.load(eval_path)
     except Exception as e:
-        logger.error(f"Failed to load model data from {model_path} for make {make}: {e}", exc_info=True)
+        logger.error(f"Failed to load model data from {serve_path} / {eval_path} for make {make}: {e}", exc_info=True)
         return
 
-    model = model_data['model']
+    coef = model_data['coef']
+    intercept = model_data['intercept']
     model_columns = model_data['model_columns']
-    X_test = model_data['X_test']
-    y_test = model_data['y_test']
+    X_test = eval_data['X_test']
+    y_test = eval_data['y_test']
 
     # When loading X_test, it might not contain all possible dummy variables that the model
     # was trained on (e.g., if a specific 'model' or 'fuel type' was not present in the X_test subset).
-    # This loop adds any missing columns from 'model_columns' to 'X_test' and fills them with 0.
-    # It then reorders X_test to match the training column order.
-    # This ensures consistency required by the trained model for prediction.
-    for col in model_columns:
-        if col not in X_test.columns:
-            X_test[col] = 0
-    X_test = X_test[model_columns]
+    # A single reindex adds any missing columns from 'model_columns' filled with 0 and reorders
+    # X_test to match the training column order, as the trained model requires.
+    # The model is stored as plain coefficients, so X_test is handed over as an array as well.
+    X_test = X_test.reindex(columns=model_columns, fill_value=0).to_numpy(dtype=np.float32, copy=False)
 
-    if X_test.empty or y_test.empty:
+    if X_test.size == 0 or y_test.empty:
         logger.warning(f"Test data (X_test or y_test) is empty for make: {make}. Cannot perform evaluation.")
         return
 
-    y_pred = model.predict(X_test)
-    score = model.score(X_test, y_test)
+    y_pred = X_test @ coef + intercept
+    score = r2_score(y_test, y_pred)
     mae = mean_absolute_error(y_test, y_pred)
 
     logger.info(f"Evaluation Results for model: {make}")
@@ -66,11 +73,12 @@ def evaluate_model(make):
     result_df['Predicted'] = y_pred
     result_df['Error'] = (result_df['price'] - result_df['Predicted']).abs()
 
-    top_accurate = result_df.sort_values(by='Error').head(10)
+    errors = result_df['Error'].to_numpy()
+    top_accurate = result_df.iloc[smallest_indices(errors, 10)]
     logger.info("\nTOP 10 Most Accurate Predictions:")
     print(top_accurate[['price', 'Predicted', 'Error']])
 
-    top_inaccurate = result_df.sort_values(by='Error', ascending=False).head(10)
+    top_inaccurate = result_df.iloc[smallest_indices(-errors, 10)]
     logger.info("\nTOP 10 Least Accurate Predictions:")
     print(top_inaccurate[['price', 'Predicted', 'Error']])
 
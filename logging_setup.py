@@ -0,0 +1,101 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+
+LOG_FILE = "app_activity.log"
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+FILE_BUFFER_CAPACITY = 1000
+FILE_FLUSH_INTERVAL_SECONDS = 5
+
+_configured = False
+_listener = None
+
+class _BufferedFileHandler(logging.handlers.MemoryHandler):
+    """
+    Writes the log file in batches. The buffer is flushed when it is full, on any WARNING or worse,
+    and by a background thread every FILE_FLUSH_INTERVAL_SECONDS, so records never wait long even in a quiet process.
+    Closing it also closes the file handler it writes to.
+    """
+
+    def __init__(self, target: logging.Handler):
+        super().__init__(FILE_BUFFER_CAPACITY, flushLevel=logging.WARNING, target=target)
+        self._closed = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_periodically, name='log-flush', daemon=True)
+        self.flusher.start()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(FILE_FLUSH_INTERVAL_SECONDS):
+            self.flush()
+
+    def close(self):
+        self._closed.set()
+        target = self.target
+        try:
+            super().close()
+        finally:
+            if target is not None:
+                target.close()
+
+def _make_handlers(buffer_file_writes: bool = True) -> tuple:
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = logging.FileHandler(LOG_FILE, delay=True)
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    if buffer_file_writes:
+        file_handler = _BufferedFileHandler(file_handler)
+    return file_handler, stream_handler
+
+def _configure():
+    """
+    Configures the root logger once per process. Records are put on an in-memory queue and
+    written to the log file and console by a background listener thread, so logging calls
+    never block on I/O. The log file itself is only opened when the first record is written.
+    """
+    global _configured, _listener
+    if _configured:
+        return
+    _configured = True
+
+    log_queue = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, *_make_handlers())
+    _listener.start()
+    # Stopping the listener drains the queue, so no records are lost when the process exits.
+    atexit.register(_listener.stop)
+
+def configure_worker_process():
+    """
+    Process pool initializer that makes a worker process log straight to unbuffered handlers.
+    Worker processes exit without running atexit hooks, so a queue listener or write buffer would lose records.
+    Works with every start method: a forked worker inherits the parent's queue handler but not its listener thread,
+    while a spawned one has already started a listener of its own when it imported the scraper.
+    Each worker appends to the log file through its own file handle.
+    """
+    global _configured, _listener
+    if _listener is not None:
+        atexit.unregister(_listener.stop)
+        _listener.stop()
+        for handler in _listener.handlers:
+            # A live flush thread means the handler was built in this process; an inherited copy holds the parent's
+            # buffered records, which the parent writes itself.
+            if isinstance(handler, _BufferedFileHandler) and handler.flusher.is_alive():
+                handler.close()
+        _listener = None
+    _configured = True
+    logging.getLogger().handlers = list(_make_handlers(buffer_file_writes=False))
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Returns a logger that writes to the shared application log.
+
+    Args:
+        name (str): The logger name, usually the calling module's __name__.
+    """
+    _configure()
+    return logging.getLogger(name)
@@ -1,79 +1,81 @@
+import functools
 import joblib
-import pandas as pd
+import numpy as np
 import os
-import logging
+from logging_setup import get_logger
 
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    handlers=[
-                        logging.FileHandler("app_activity.log"),
-                        logging.StreamHandler()
-                    ])
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 def load_model(make: str):
     """
     Loads a trained model and its associated metadata for a specific car make.
+    Loaded models are cached in memory, so repeated predictions for the same make skip the disk read.
 
     Args:
         make (str): The car make for which to load the model.
 
     Returns:
-        dict: A dictionary containing the model, model_columns, X_test, y_test,
-              categorical_unique_values and original_categorical_cols.
+        dict: A dictionary containing the model's coef and intercept, model_columns, col_index,
+              categorical_unique_values, original_categorical_cols and their frozenset categorical_col_set.
 
     Raises:
         FileNotFoundError: If the model file does not exist.
         Exception: For any other errors during model loading.
     """
 
-    path = f'models/{make}_model.pkl'
+    path = f'models/{make}_serve.pkl'
     logger.info(f"Attempting to load model for make: {make} from {path}")
     if not os.path.exists(path):
         logger.error(f"Model file not found: {path}")
         raise FileNotFoundError(f'Model for {make} not found at {path}')
+    # The file's modification time is part of the cache key, so a retrained model is picked up without a restart.
+    return _load_model_file(make, path, os.path.getmtime(path))
+
+@functools.lru_cache(maxsize=32)
+def _load_model_file(make: str, path: str, mtime: float):
     try:
         model_data = joblib.load(path)
+        # Built once per load, so the per-prediction categorical check is a set lookup rather than a list scan.
+        model_data['categorical_col_set'] = frozenset(model_data['original_categorical_cols'])
         logger.info(f"Successfully loaded model for make: {make}.")
         return model_data
     except Exception as e:
         logger.error(f"Error loading model for make {make} from {path}: {e}", exc_info=True)
         raise
 
-def prepare_input(user_input_dict: dict, model_columns: list, original_categorical_cols: list) -> pd.DataFrame:
+def prepare_input(user_input_dict: dict, col_index: dict, original_categorical_cols: frozenset) -> np.ndarray:
     """
-    Prepares a user's car specifications into a DataFrame format suitable for model prediction.
-    This involves creating a DataFrame with all expected model columns and correctly
-    handling numerical and one-hot encoded categorical features.
+    Prepares a user's car specifications into a feature row suitable for model prediction.
+    The row is a single zero-filled array in the model's column order, in which numerical
+    features are written directly and categorical features set their one-hot dummy column.
 
     Args:
         user_input_dict (dict): A dictionary of user-provided car specifications.
-        model_columns (list): A list of column names the model was trained on.
-        original_categorical_cols (list): A list of original categorical column names.
+        col_index (dict): A mapping of each column the model was trained on to its position.
+        original_categorical_cols (frozenset): The original categorical column names.
 
     Returns:
-        pd.DataFrame: A DataFrame with one row, ready for prediction.
+        np.ndarray: A (1, n_features) array, ready for prediction.
     """
-    final_input_df = pd.DataFrame(0, index=[0], columns=model_columns)
+    row = np.zeros(len(col_index), dtype=np.float32)
 
     for key, value in user_input_dict.items():
         # Handle numerical features (e.g., year, mileage).
-        if key in final_input_df.columns:
-            final_input_df[key] = value
+        if key in col_index:
+            row[col_index[key]] = value
         # Handle categorical features by identifying and setting the correct dummy variable.
         elif key in original_categorical_cols:
-            dummy_col_name = f'{key}_{value}'
-            if dummy_col_name in final_input_df.columns:
-                final_input_df[dummy_col_name] = 1
+            dummy_col_idx = col_index.get(f'{key}_{value}')
+            if dummy_col_idx is not None:
+                row[dummy_col_idx] = 1
             else:
                 logger.warning(f"Categorical value '{value}' for column '{key}' not found in model's trained columns. Skipping.")
         else:
             logger.warning(f"User input key '{key}' is not a recognized feature for prediction. Skipping.")
-    
-    final_input_df = final_input_df[model_columns]
 
-    logger.info(f"Input DataFrame prepared for prediction. Shape: {final_input_df.shape}")
-    return final_input_df
+    input_row = row.reshape(1, -1)
+    logger.info(f"Input row prepared for prediction. Shape: {input_row.shape}")
+    return input_row
 
 def predict_price(make: str, user_input_dict: dict) -> float:
     """
@@ -93,17 +95,19 @@ def predict_price(make: str, user_input_dict: dict) -> float:
     logger.info(f"Starting price prediction for make: {make} with specs: {user_input_dict}")
     try:
         model_data = load_model(make)
-        model = model_data['model']
+        coef = model_data['coef']
+        intercept = model_data['intercept']
         model_columns = model_data['model_columns']
-        original_categorical_cols = model_data['original_categorical_cols']
+        original_categorical_cols = model_data['categorical_col_set']
+        col_index = model_data['col_index']
 
-        input_df = prepare_input(user_input_dict, model_columns, original_categorical_cols)
+        input_row = prepare_input(user_input_dict, col_index, original_categorical_cols)
 
-        if input_df.empty or input_df.shape[1] != len(model_columns):
-            logger.error("Prepared input DataFrame is invalid or has wrong number of columns for prediction.")
+        if input_row.size == 0 or input_row.shape[1] != len(model_columns):
+            logger.error("Prepared input row is invalid or has wrong number of columns for prediction.")
             raise ValueError("Invalid input data for prediction.")
 
-        predicted_price = model.predict(input_df)[0]
+        predicted_price = float(input_row[0] @ coef + intercept)
         logger.info(f"Predicted price for {make} is: {predicted_price:.2f} EUR")
         return round(predicted_price, 2)
     except FileNotFoundError as e:
@@ -1,21 +1,25 @@
 import sqlite3
-import logging
+from logging_setup import get_logger
+from db import CREATE_PAGE_CACHE_SQL, DB_NAME, connect
 
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    handlers=[
-                        logging.FileHandler("app_activity.log"),
-                        logging.StreamHandler()
-                    ])
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
-DB_NAME = 'cars.db'
+# Larger pages mean fewer B-tree levels and fewer reads per table scan.
+PAGE_SIZE = 65536
 
 def setup_database():
     logger.info(f"Attempting to connect to the database and set up the 'cars' table in: {DB_NAME}")
     try:
-        with sqlite3.connect(DB_NAME) as conn:
+        with connect() as conn:
             c = conn.cursor()
+            # The page size cannot be changed while the database is in WAL mode,
+            # so on first run switch back to a rollback journal, rebuild and re-enable WAL.
+            if c.execute("PRAGMA page_size").fetchone()[0] != PAGE_SIZE:
+                logger.info(f"Rebuilding '{DB_NAME}' with a page size of {PAGE_SIZE} bytes.")
+                c.execute("PRAGMA journal_mode=DELETE")
+                c.execute(f"PRAGMA page_size={PAGE_SIZE}")
+                c.execute("VACUUM")
+                c.execute("PRAGMA journal_mode=WAL")
             c.execute('''
                 CREATE TABLE IF NOT EXISTS cars (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -32,6 +36,9 @@ def setup_database():
                     mileage INTEGER
                 )
             ''')
+            # Per-make lookups and the DISTINCT make listing use this index instead of scanning the whole table.
+            c.execute("CREATE INDEX IF NOT EXISTS idx_cars_make ON cars(make)")
+            c.execute(CREATE_PAGE_CACHE_SQL)
             conn.commit()
             logger.info(f"Table 'cars' successfully created or already exists in '{DB_NAME}'.")
     except sqlite3.Error as e:
@@ -1,8 +1,9 @@
 import streamlit as st
 import pandas as pd
 import os
+import json
 import numpy as np
-from db import get_cars_by_make
+from db import get_cars_df
 from predict_price import predict_price
 
 # --- Page Configuration ---
@@ -14,21 +15,28 @@ st.set_page_config(
 )
 
 # --- Helper Functions ---
+@st.cache_data(ttl=60) # Rescan for newly trained models at most once a minute, not on every widget interaction
 def get_available_makes() -> list:
     """
-    Scans the 'models' directory to find available car makes based on saved model files.
-    Assumes model files are named like 'make_model.pkl' (e.g., 'BMW_model.pkl').
+    Reads the available car makes from the 'manifest.json' written to the 'models' directory at training time.
+    Without a manifest, scans the 'models' directory for saved model files instead,
+    assuming they are named like 'make_serve.pkl' (e.g., 'BMW_serve.pkl').
     """
     models_dir = 'models'
     if not os.path.exists(models_dir):
         st.error(f"'{models_dir}' directory not found. Please ensure models are trained and saved.")
         return []
     
-    makes = set()
-    for filename in os.listdir(models_dir):
-        if filename.endswith("_model.pkl"):
-            make = filename.split('_model.pkl')[0]
-            makes.add(make)
+    manifest_path = os.path.join(models_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            makes = set(json.load(f))
+    else:
+        makes = set()
+        for filename in os.listdir(models_dir):
+            if filename.endswith("_serve.pkl"):
+                make = filename.split('_serve.pkl')[0]
+                makes.add(make)
     
     if not makes:
         st.error(f"No model files found in the '{models_dir}' directory. Please train models first.")
@@ -36,26 +44,27 @@ def get_available_makes() -> list:
     
     return sorted(list(makes))
 
-@st.cache_data # Cache the results to avoid re-running on every widget interaction
-def get_features_for_make(make: str) -> dict:
+@st.cache_data(ttl=300) # Cache the results to avoid re-running on every widget interaction
+def get_features_for_make(make: str) -> tuple:
     """
-    Loads unique feature values (model, body_type, fuel, gearbox) for a given car make from the database.
+    Loads unique feature values (model, body_type, fuel, gearbox) and the default numeric inputs
+    for a given car make from the database, so both come from a single query.
     This function is cached to improve performance.
     """
     try:
-        data, columns = get_cars_by_make(make)
-        df = pd.DataFrame(data, columns=columns)
-        
+        df = get_cars_df(make)
+
+        # np.unique returns the distinct values already sorted, in a single pass.
         features = {
-            'model': sorted(df['model'].dropna().unique().tolist()) if 'model' in df.columns else [],
-            'body_type': sorted(df['body_type'].dropna().unique().tolist()) if 'body_type' in df.columns else [],
-            'fuel': sorted(df['fuel'].dropna().unique().tolist()) if 'fuel' in df.columns else [],
-            'gearbox': sorted(df['gearbox'].dropna().unique().tolist()) if 'gearbox' in df.columns else []
+            'model': np.unique(df['model'].dropna().to_numpy()) if 'model' in df.columns else [],
+            'body_type': np.unique(df['body_type'].dropna().to_numpy()) if 'body_type' in df.columns else [],
+            'fuel': np.unique(df['fuel'].dropna().to_numpy()) if 'fuel' in df.columns else [],
+            'gearbox': np.unique(df['gearbox'].dropna().to_numpy()) if 'gearbox' in df.columns else []
         }
-        return features
+        return features, get_default_values(df)
     except Exception as e:
         st.error(f"Failed to load features for {make}: {str(e)}")
-        return {}
+        return {}, get_default_values(pd.DataFrame())
     
 def get_default_value(df_col: pd.Series, dtype, fallback):
     """
@@ -66,11 +75,23 @@ def get_default_value(df_col: pd.Series, dtype, fallback):
         if df_col.empty or df_col.isnull().all():
             return fallback
         
-        mode_val = df_col.dropna().mode()[0]
+        mode_val = df_col.dropna().mode().iat[0]
         return dtype(mode_val)
     except (IndexError, TypeError, ValueError):
         return fallback
 
+def get_default_values(df: pd.DataFrame) -> dict:
+    """
+    Computes the default year, mileage, engine size and engine power offered for a car make,
+    using the most common value of each column in its listings.
+    """
+    return {
+        'year': get_default_value(df.get('year', pd.Series(dtype='int')), int, 2018),
+        'mileage': get_default_value(df.get('mileage', pd.Series(dtype='int')), int, 50000),
+        'engine_volume': get_default_value(df.get('engine_volume', pd.Series(dtype='float')), float, 2.0),
+        'engine_power': get_default_value(df.get('engine_power', pd.Series(dtype='int')), int, 150)
+    }
+
 # --- Streamlit UI ---
 st.title("🚗 Car Price Predictor")
 st.markdown("Fill in the details below to get a price prediction for your car.")
@@ -87,20 +108,17 @@ if "No models found" in available_makes and len(available_makes) == 1:
 # --- Input Fields ---
 selected_make = st.sidebar.selectbox("Car Make", options=available_makes, key="make_select")
 
-features = get_features_for_make(selected_make)
-
-data_for_defaults, columns_for_defaults = get_cars_by_make(selected_make)
-df_for_defaults = pd.DataFrame(data_for_defaults, columns=columns_for_defaults)
+features, defaults = get_features_for_make(selected_make)
 
-car_model = st.sidebar.selectbox("Car Model", options=sorted(features.get('model', [])), key="model_select")
-body_type = st.sidebar.selectbox("Body Type", options=sorted(features.get('body_type', [])), key="body_type_select")
-fuel = st.sidebar.selectbox("Fuel Type", options=sorted(features.get('fuel', [])), key="fuel_select")
-gearbox = st.sidebar.selectbox("Gearbox", options=sorted(features.get('gearbox', [])), key="gearbox_select")
+car_model = st.sidebar.selectbox("Car Model", options=features.get('model', []), key="model_select")
+body_type = st.sidebar.selectbox("Body Type", options=features.get('body_type', []), key="body_type_select")
+fuel = st.sidebar.selectbox("Fuel Type", options=features.get('fuel', []), key="fuel_select")
+gearbox = st.sidebar.selectbox("Gearbox", options=features.get('gearbox', []), key="gearbox_select")
 
-default_year = get_default_value(df_for_defaults.get('year', pd.Series(dtype='int')), int, 2018)
-default_mileage = get_default_value(df_for_defaults.get('mileage', pd.Series(dtype='int')), int, 50000)
-default_engine_volume = get_default_value(df_for_defaults.get('engine_volume', pd.Series(dtype='float')), float, 2.0)
-default_engine_power = get_default_value(df_for_defaults.get('engine_power', pd.Series(dtype='int')), int, 150)
+default_year = defaults['year']
+default_mileage = defaults['mileage']
+default_engine_volume = defaults['engine_volume']
+default_engine_power = defaults['engine_power']
 
 # Function to create number input with text fallback and validation
 def create_numeric_input(label, default_value, dtype, key_suffix, placeholder_text=None):
@@ -1,18 +1,35 @@
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
 import joblib
+import json
 import os
-import logging
-from db import get_cars_by_make, get_all_car_makes
+from logging_setup import get_logger
+from db import get_cars_df, get_all_cars_grouped
 
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    handlers=[
-                        logging.FileHandler("app_activity.log"),
-                        logging.StreamHandler()
-                    ])
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
+
+def one_hot_encode(df: pd.DataFrame, columns: list, categories: dict) -> pd.DataFrame:
+    """
+    One-hot encodes the given categorical columns, producing the same '<column>_<value>' dummy
+    columns as pd.get_dummies. Each column is encoded with a single numpy equality broadcast
+    into a contiguous int8 matrix, instead of building one Series per category.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to encode.
+        columns (list): The categorical columns to replace with dummy columns.
+        categories (dict): The sorted unique values of each categorical column.
+
+    Returns:
+        pd.DataFrame: The remaining columns of df followed by the dummy columns.
+    """
+    dummies = []
+    for col in columns:
+        cats = categories[col]
+        mat = (df[col].to_numpy()[:, None] == np.asarray(cats, dtype=object)).astype(np.int8)
+        dummies.append(pd.DataFrame(mat, index=df.index, columns=[f'{col}_{cat}' for cat in cats]))
+    return pd.concat([df.drop(columns=columns)] + dummies, axis=1)
 
 def train_and_save_model(make: str):
     """
@@ -22,16 +39,27 @@ def train_and_save_model(make: str):
     Args:
         make (str): The car make for which to train the model (e.g., 'BMW').
     """
-    logger.info(f"Starting model training process for make: {make}")
+    return train_and_save_model_from_df(make, get_cars_df(make))
+
+def train_and_save_model_from_df(make: str, df: pd.DataFrame):
+    """
+    Trains a Linear Regression model for a specific car make from already loaded listings,
+    and saves the model along with necessary metadata to a .pkl file.
 
-    data, columns = get_cars_by_make(make)
-    df = pd.DataFrame(data, columns=columns)
+    Args:
+        make (str): The car make for which to train the model (e.g., 'BMW').
+        df (pd.DataFrame): The car listings of that make, with the columns of the 'cars' table.
+
+    Returns:
+        bool: True if a model was trained and saved, False otherwise.
+    """
+    logger.info(f"Starting model training process for make: {make}")
 
     df = df.dropna()
 
     if df.empty:
         logger.warning(f"No sufficient data available for make: {make} after dropping NaNs. Cannot train model.")
-        return
+        return False
 
     categorical_cols = ['model', 'body_type', 'fuel', 'gearbox']
     
@@ -47,7 +75,7 @@ def train_and_save_model(make: str):
         else:
             logger.warning(f"Warning: Categorical column '{col}' not found in DataFrame for make: {make}. Check column names.")
 
-    df_encoded = pd.get_dummies(df, columns=[col for col in categorical_cols if col in df.columns], dtype=int)
+    df_encoded = one_hot_encode(df, [col for col in categorical_cols if col in categorical_unique_values], categorical_unique_values)
     logger.info(f"DataFrame shape after one-hot encoding: {df_encoded.shape}")
 
     cols_to_drop_from_X = ['id', 'ad_id', 'make', 'price']
@@ -55,20 +83,22 @@ def train_and_save_model(make: str):
 
     if 'price' not in df_encoded.columns:
         logger.error(f"'price' column not found in the DataFrame for make: {make}. Cannot train model.")
-        return
+        return False
     
-    X = df_encoded[X_cols]
-    y = df_encoded['price']
+    # float32 halves the memory of the design matrix and keeps ample precision for car prices.
+    X = df_encoded[X_cols].astype(np.float32)
+    y = df_encoded['price'].astype(np.float32)
 
     if X.empty:
         logger.warning(f"Feature DataFrame (X) is empty for make: {make} after encoding/filtering. Cannot train model.")
-        return
+        return False
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     logger.info(f"Data split into training and testing sets. X_train shape: {X_train.shape}, X_test shape: {X_test.shape}")
 
+    # Fit on plain arrays: predictions are made from positional feature rows built via 'col_index'.
     model = LinearRegression()
-    model.fit(X_train, y_train)
+    model.fit(X_train.to_numpy(), y_train.to_numpy())
     logger.info(f"Linear Regression model trained successfully for make: {make}.")
 
     models_dir = 'models'
@@ -76,27 +106,58 @@ def train_and_save_model(make: str):
         os.makedirs(models_dir)
         logger.info(f"Created directory for models: {models_dir}")
 
-    # Save the trained model and essential metadata.
+    # Save the trained model and essential metadata, split into what predictions need and what
+    # evaluation needs, so serving a prediction never has to unpickle the held-out test data.
+    # A linear model's prediction is just 'row @ coef + intercept', so only those are kept
+    # instead of the scikit-learn estimator, which keeps scikit-learn out of prediction time.
     # 'model_columns' is crucial for ensuring prediction inputs match training features.
-    # 'X_test', 'y_test' are saved for later model evaluation.
+    # 'col_index' maps each of those columns to its position in the prediction input row.
     # 'categorical_unique_values' ensures consistent encoding for new predictions.
+    # 'X_test', 'y_test' are saved separately for later model evaluation.
+    serve_path = f'{models_dir}/{make}_serve.pkl'
+    eval_path = f'{models_dir}/{make}_eval.pkl'
     joblib.dump({
-        'model': model,
+        'coef': model.coef_.astype(np.float32),
+        'intercept': float(model.intercept_),
         'model_columns': X_train.columns.tolist(),
-        'X_test': X_test,
-        'y_test': y_test,
+        'col_index': {col: i for i, col in enumerate(X_train.columns)},
         'categorical_unique_values': categorical_unique_values,
         'original_categorical_cols': categorical_cols
-    }, f'{models_dir}/{make}_model.pkl')
-    logger.info(f"Model and metadata for make {make} successfully saved to {models_dir}/{make}_model.pkl")
+    }, serve_path, compress=0, protocol=5)
+    joblib.dump({
+        'X_test': X_test,
+        'y_test': y_test
+    }, eval_path, compress=('lz4', 1), protocol=5)
+    logger.info(f"Model and metadata for make {make} successfully saved to {serve_path} and {eval_path}")
+    return True
+
+def write_manifest(models_dir: str = 'models'):
+    """
+    Writes the list of car makes with a saved model to 'manifest.json' in the models directory,
+    so the Streamlit app can read the available makes without scanning the directory.
+    The list is rebuilt from the 'make_serve.pkl' files on disk, so models from earlier runs stay listed.
+
+    Args:
+        models_dir (str): The directory the models were saved to.
+    """
+    os.makedirs(models_dir, exist_ok=True)
+    suffix = '_serve.pkl'
+    makes = sorted(filename[:-len(suffix)] for filename in os.listdir(models_dir) if filename.endswith(suffix))
+    manifest_path = os.path.join(models_dir, 'manifest.json')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(makes, f)
+    logger.info(f"Wrote manifest of {len(makes)} car makes with a saved model to {manifest_path}")
 
 if __name__ == "__main__":
-    all_car_makes = get_all_car_makes()
-    if not all_car_makes:
+    # Load all listings once and split them per make, instead of querying the database for every make.
+    all_cars = get_all_cars_grouped()
+    if all_cars.empty:
         logger.warning("No car makes found in the database. Cannot train any models.")
     else:
+        all_car_makes = all_cars['make'].unique().tolist()
         logger.info(f"Found {len(all_car_makes)} car makes to train models for: {', '.join(all_car_makes)}")
-        for make in all_car_makes:
-            train_and_save_model(make)
+        for make, df in all_cars.groupby('make', sort=False):
+            train_and_save_model_from_df(make, df)
             logger.info("-" * 50)
+    write_manifest()
     logger.info("train_and_save_model.py script finished.")
@@ -1,159 +1,405 @@
-import logging
-from bs4 import BeautifulSoup
+import asyncio
+import os
+import random
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import aiohttp
+from selectolax.lexbor import LexborHTMLParser
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
 import time
 
-from db import insert_car
+from db import get_all_ad_ids, get_page_validators, insert_cars, refresh_statistics, save_page_validators
+from logging_setup import configure_worker_process, get_logger
 
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                    handlers=[
-                        logging.FileHandler("app_activity.log"),
-                        logging.StreamHandler()
-                    ])
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
-def scrape_autoplius(car_brands: list, pages_per_brand: int = 1, start_page: int = 1):
+# Listing pages are server-rendered, so they are fetched with plain HTTP requests.
+# Concurrency is capped per host, and each request waits a short random delay, to avoid being rate limited or banned.
+MAX_CONNECTIONS = 20
+MAX_CONNECTIONS_PER_HOST = 4
+REQUEST_JITTER_SECONDS = (0.1, 0.5)
+# Idle connections stay open this long, so later pages reuse the TCP/TLS session instead of handshaking again.
+KEEPALIVE_TIMEOUT_SECONDS = 60
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36',
+    'Accept-Language': 'lt-LT,lt;q=0.9,en;q=0.8'
+}
+
+# Browser workers start this many seconds apart, so their page loads are spread out.
+BROWSER_START_STAGGER_SECONDS = 0.1
+# Longest time to wait for a page's listings to appear before treating the page as empty.
+PAGE_LOAD_TIMEOUT_SECONDS = 10
+# Requests the browser never needs to make for the listings to render.
+BLOCKED_URL_PATTERNS = ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.woff', '*.woff2',
+                        '*analytics*', '*googletagmanager*', '*doubleclick*', '*adservice*', '*/ads/*']
+
+# CSS selectors for the parts of a listing card, shared by every parse.
+SEL_LISTING = 'a.announcement-item'
+SEL_ID = 'div.announcement-bookmark-button'
+SEL_TITLE = 'div.announcement-title'
+SEL_PRICE = 'div.announcement-pricing-info'
+SEL_TITLE_PARAMS_SPAN = 'div.announcement-title-parameters span'
+SEL_PARAMS_SPAN = 'div.announcement-parameters-block span'
+
+# Numbers as shown on listing cards: integers with space-grouped thousands ('19 171 €', '137 375 km')
+# and decimals ('2.0 l.'). One regex search replaces a chain of replace/strip calls per field.
+INT_RE = re.compile(r'\d+(?:[ \xa0]\d{3})*')
+DECIMAL_RE = re.compile(r'\d+(?:\.\d+)?')
+_THOUSANDS_SEPARATORS = str.maketrans('', '', ' \xa0')
+
+def parse_int(text: str):
+    """Returns the first integer in the text, ignoring thousands separators, or None if there is none."""
+    match = INT_RE.search(text)
+    return int(match.group().translate(_THOUSANDS_SEPARATORS)) if match else None
+
+LISTING_URL_TEMPLATE = "https://autoplius.lt/skelbimai/naudoti-automobiliai/%s?category_id=2&page_nr=%d"
+
+def listing_url(brand: str, page: int) -> str:
+    return LISTING_URL_TEMPLATE % (brand, page)
+
+def store_listings(cars: list, brand: str, page: int):
     """
-    Scrapes car listing data from autoplius.lt for specified car brands and pages.
+    Writes the car listings parsed from one page to the database in a single transaction.
 
     Args:
-        car_brands (list): A list of car brand slugs (e.g., ['bmw', 'audi']).
-        pages_per_brand (int): The number of pages to scrape for each brand.
-        start_page (int): The starting page number for scraping.
+        cars (list): The car data tuples parsed from the page.
+        brand (str): The brand slug the page belongs to.
+        page (int): The page number.
+    """
+    inserted = insert_cars(cars)
+    logger.info(f"Inserted {inserted} new car listings into DB from page {page} for brand '{brand}' ({len(cars)} parsed).")
+
+def new_listings(cars: list, seen_ad_ids: set) -> list:
+    """
+    Drops the listings that are already stored, so re-scraped pages do not send known rows to the database.
+
+    Args:
+        cars (list): The car data tuples parsed from a page.
+        seen_ad_ids (set): The ad_ids stored so far. The returned listings' ad_ids are added to it.
+
+    Returns:
+        list: The listings whose ad_id has not been seen yet.
+    """
+    new_cars = [car for car in cars if car[0] not in seen_ad_ids]
+    seen_ad_ids.update(car[0] for car in new_cars)
+    return new_cars
+
+def parse_listings(html: str | bytes) -> list:
+    """
+    Parses all car listings on an autoplius.lt listing page.
+
+    Args:
+        html (str | bytes): The HTML source of the listing page. Raw response bytes are parsed as-is, without decoding them to a str first.
+
+    Returns:
+        list: A list of car data tuples, in the column order of the 'cars' table. Empty if the page has no listings.
+    """
+    tree = LexborHTMLParser(html)
+    listings = tree.css(SEL_LISTING)
+    cars = []
+
+    for listing in listings:
+        try:
+            # Extract ad_id, which is critical for unique identification in the database.
+            ad_id = None
+            id_div = listing.css_first(SEL_ID)
+            if id_div:
+                ad_id = id_div.attributes.get('data-id')
+
+            if not ad_id:
+                logger.warning("Could not find 'ad_id' for a listing. Skipping this listing.")
+                continue
+
+            # Extract car make and model from the main title element.
+            title_elem = listing.css_first(SEL_TITLE)
+            if not title_elem:
+                logger.warning(f"Title element not found for ad_id: {ad_id}. Skipping.")
+                continue
+
+            title = title_elem.text().strip()
+            make, _, model = title.partition(' ')
+            model = model or None
+
+            # Extract and clean the price value.
+            price_elem = listing.css_first(SEL_PRICE)
+            price_value = None
+            if price_elem:
+                price_text = price_elem.text().strip().partition('\n')[0]
+                price_value = parse_int(price_text)
+                if price_value is None:
+                    logger.warning(f"Could not convert price '{price_text}' to int for ad_id: {ad_id}")
+
+            # Extract year and body type from specific span elements.
+            year = None
+            body_type = None
+            title_spans = listing.css(SEL_TITLE_PARAMS_SPAN)
+            if len(title_spans) > 0:
+                year_text = title_spans[0].text(strip=True)[:4]
+                try:
+                    year = int(year_text)
+                except ValueError:
+                    logger.warning(f"Could not convert year '{year_text}' to int for ad_id: {ad_id}")
+                    year = None
+            if len(title_spans) > 1:
+                body_type = title_spans[1].text(strip=True)
+
+            # Extract fuel type, gearbox, engine information, and mileage.
+            fuel = None
+            gearbox = None
+            engine_volume = None
+            engine_power = None
+            mileage = None
+            # Only fuel, gearbox, engine and mileage are used, so trailing auxiliary spans are never read.
+            block_spans_values = [s.text(strip=True) for s in listing.css(SEL_PARAMS_SPAN)[:4]]
+
+            if len(block_spans_values) > 0:
+                fuel = block_spans_values[0]
+            if len(block_spans_values) > 1:
+                gearbox = block_spans_values[1]
+            if len(block_spans_values) > 2:
+                engine_info = block_spans_values[2]
+                if ',' in engine_info:
+                    parts = [p.strip() for p in engine_info.split(',')]
+                    if len(parts) >= 2:
+                        volume_match = DECIMAL_RE.search(parts[0])
+                        if volume_match:
+                            engine_volume = float(volume_match.group())
+                        else:
+                            logger.warning(f"Could not convert engine volume '{parts[0]}' to float for ad_id: {ad_id}")
+
+                        engine_power = parse_int(parts[1])
+                        if engine_power is None:
+                            logger.warning(f"Could not convert engine power '{parts[1]}' to int for ad_id: {ad_id}")
+                else:
+                    logger.warning(f"Engine info format missing comma for '{engine_info}' for ad_id: {ad_id}")
+            if len(block_spans_values) > 3:
+                mileage_text = block_spans_values[3]
+                if ' km' in mileage_text.lower():
+                    mileage = parse_int(mileage_text)
+                    if mileage is None:
+                        logger.warning(f"Could not convert mileage '{mileage_text}' to int for ad_id: {ad_id}")
+                else:
+                    logger.warning(f"Mileage format not recognized or 'km' not found for '{mileage_text}' for ad_id: {ad_id}")
+
+            car_data = (ad_id, make, model, price_value, year, body_type, fuel, gearbox, engine_volume, engine_power, mileage)
+            cars.append(car_data)
+            logger.debug("Parsed listing ad_id=%s", ad_id)
+        except Exception as e:
+            logger.error(f"An unexpected error occurred while processing a listing: {e}. Skipping this listing. Ad ID might be missing or unidentifiable.", exc_info=True)
+            continue
+
+    return cars
+
+async def fetch(session: aiohttp.ClientSession, url: str, semaphore: asyncio.Semaphore, validators: tuple = (None, None)):
+    """
+    Downloads a single page with a conditional GET, so a page unchanged since the last run costs only a 304 response.
+    The raw HTML bytes go straight to the C parser, so the page is never decoded into a Python str.
+
+    Args:
+        session (aiohttp.ClientSession): The shared HTTP session.
+        url (str): The page URL.
+        semaphore (asyncio.Semaphore): Limits how many requests run at once.
+        validators (tuple): The (etag, last_modified) pair stored for the page by a previous run.
+
+    Returns:
+        tuple: The page's HTML bytes, or None if the request failed or the page has not changed,
+            and the page's new (etag, last_modified) pair.
+    """
+    etag, last_modified = validators
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    async with semaphore:
+        await asyncio.sleep(random.uniform(*REQUEST_JITTER_SECONDS))
+        logger.info(f"Loading page: {url}")
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    logger.info(f"Page not modified since the last run, skipping: {url}")
+                    return None, validators
+                response.raise_for_status()
+                return await response.read(), (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        except Exception as e:
+            logger.error(f"Failed to load page {url}: {e}")
+            return None, validators
+
+async def scrape_page(session: aiohttp.ClientSession, brand: str, page: int, semaphore: asyncio.Semaphore,
+                      parse_executor: ProcessPoolExecutor, db_executor: ThreadPoolExecutor, seen_ad_ids: set,
+                      validators: tuple = (None, None)):
+    """
+    Downloads, parses and stores a single listing page.
+    Parsing runs in a worker process and the database writes on the executor's thread,
+    so the event loop keeps downloading other pages meanwhile.
+    """
+    url = listing_url(brand, page)
+    html, new_validators = await fetch(session, url, semaphore, validators)
+    if html is None:
+        return
+    loop = asyncio.get_running_loop()
+    # A failed page is logged and skipped, so it never cancels the other pages gathered alongside it.
+    try:
+        cars = await loop.run_in_executor(parse_executor, parse_listings, html)
+    except BrokenProcessPool as e:
+        logger.error(f"Failed to parse page {page} for brand '{brand}': {e}")
+        return
+    if not cars:
+        logger.warning(f"No listings found on page {page} for brand '{brand}'.")
+        return
+    cars = new_listings(cars, seen_ad_ids)
+    try:
+        if cars:
+            await loop.run_in_executor(db_executor, store_listings, cars, brand, page)
+        else:
+            logger.info(f"All listings on page {page} for brand '{brand}' are already stored.")
+        # Only remembered once the listings are stored, so a failed run never makes the next one skip the page.
+        if new_validators != validators and any(new_validators):
+            await loop.run_in_executor(db_executor, save_page_validators, url, *new_validators)
+    except sqlite3.Error as e:
+        logger.error(f"Failed to store listings from page {page} for brand '{brand}': {e}")
+        seen_ad_ids.difference_update(car[0] for car in cars)
+
+async def scrape_autoplius_async(car_brands: list, pages_per_brand: int, start_page: int):
+    """
+    Downloads all requested listing pages concurrently over HTTP, storing each page's listings as soon as it arrives.
+    """
+    pages = [(brand, page) for brand in car_brands for page in range(start_page, start_page + pages_per_brand)]
+    page_validators = get_page_validators()
+    seen_ad_ids = get_all_ad_ids()
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, limit_per_host=MAX_CONNECTIONS_PER_HOST,
+                                     keepalive_timeout=KEEPALIVE_TIMEOUT_SECONDS)
+    semaphore = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+
+    # Parsing is CPU-bound, so it is spread over worker processes instead of blocking the event loop.
+    # SQLite allows a single writer at a time, so one thread (reusing its pooled connection) does all inserts.
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=configure_worker_process) as parse_executor, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer') as db_executor:
+        async with aiohttp.ClientSession(connector=connector, headers=HEADERS) as session:
+            await asyncio.gather(*(
+                scrape_page(session, brand, page, semaphore, parse_executor, db_executor, seen_ad_ids,
+                            page_validators.get(listing_url(brand, page), (None, None)))
+                for brand, page in pages
+            ))
+
+def browser_options() -> Options:
+    """
+    Builds Chrome options for scraping: headless, no images or notifications, and returning control
+    as soon as the DOM is ready instead of waiting for every stylesheet, font and script to load.
     """
     options = Options()
-    driver = webdriver.Chrome(options=options)
+    options.page_load_strategy = 'eager'
+    for argument in ('--headless=new', '--blink-settings=imagesEnabled=false', '--disable-extensions',
+                     '--disable-gpu', '--no-sandbox'):
+        options.add_argument(argument)
+    options.add_experimental_option('prefs', {
+        'profile.managed_default_content_settings.images': 2,
+        'profile.default_content_setting_values.notifications': 2,
+    })
+    return options
 
-    logger.info("Starting Autoplius.lt scraping process.")
+def scrape_brand(brand: str, pages_per_brand: int, start_page: int, start_delay: float = 0):
+    """
+    Scrapes the listing pages of one brand through its own Chrome browser driven by Selenium.
+
+    Args:
+        brand (str): The brand slug to scrape.
+        pages_per_brand (int): The number of pages to scrape.
+        start_page (int): The starting page number for scraping.
+        start_delay (float): Seconds to wait before starting, so parallel workers do not hit the site in lockstep.
+    """
+    time.sleep(start_delay)
+    driver = webdriver.Chrome(options=browser_options())
+    # Always close the browser, so a failing worker never leaves a headless Chrome behind.
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
 
-    for brand in car_brands:
+        seen_ad_ids = get_all_ad_ids()
         logger.info(f"Starting data collection for brand: {brand}")
         for page in range(start_page, start_page + pages_per_brand):
-            url = f"https://autoplius.lt/skelbimai/naudoti-automobiliai/{brand}?category_id=2&page_nr={page}"
+            url = listing_url(brand, page)
             logger.info(f"Loading page: {url}")
 
             try:
                 driver.get(url)
-                time.sleep(5)
+                # Continue as soon as the listings are in the DOM instead of always waiting a fixed time.
+                WebDriverWait(driver, PAGE_LOAD_TIMEOUT_SECONDS).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, SEL_LISTING)))
+            except TimeoutException:
+                logger.warning(f"No listings found on page {page} for brand '{brand}'. Ending collection for this brand.")
+                break
             except Exception as e:
                 logger.error(f"Failed to load page {url}: {e}")
                 continue
 
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-            listings = soup.find_all('a', {'class': 'announcement-item'})
+            cars = parse_listings(driver.page_source)
 
-            if not listings:
+            if not cars:
                 logger.warning(f"No listings found on page {page} for brand '{brand}'. Ending collection for this brand.")
                 break
 
-            for listing in listings:
-                try:
-                    # Extract ad_id, which is critical for unique identification in the database.
-                    ad_id = None
-                    id_div = listing.find('div', class_='announcement-bookmark-button')
-                    if id_div and id_div.has_attr('data-id'):
-                        ad_id = id_div['data-id']
-
-                    if not ad_id:
-                        logger.warning("Could not find 'ad_id' for a listing. Skipping this listing.")
-                        continue
-
-                    # Extract car make and model from the main title element.
-                    title_elem = listing.find('div', {'class': "announcement-title"})
-                    if not title_elem:
-                        logger.warning(f"Title element not found for ad_id: {ad_id}. Skipping.")
-                        continue
-
-                    title = title_elem.text.strip()
-                    make_and_model = title.split(' ', 1)
-                    make = make_and_model[0]
-                    model = make_and_model[1] if len(make_and_model) > 1 else None
-
-                    # Extract and clean the price value.
-                    price_elem = listing.find('div', {'class': "announcement-pricing-info"})
-                    price_value = None
-                    if price_elem:
-                        price_text = price_elem.text.strip()
-                        price_cleaned = price_text.split('\n')[0].strip().replace('€', '').replace(' ', '')
-                        try:
-                            price_value = int(price_cleaned)
-                        except ValueError:
-                            logger.warning(f"Could not convert price '{price_cleaned}' to int for ad_id: {ad_id}")
-                            price_value = None
-
-                    # Extract year and body type from specific span elements.
-                    year = None
-                    body_type = None
-                    title_params = listing.find('div', class_='announcement-title-parameters')
-                    if title_params:
-                        title_spans = title_params.find_all('span')
-                        if len(title_spans) > 0:
-                            year_text = title_spans[0].get_text(strip=True)[:4]
-                            try:
-                                year = int(year_text)
-                            except ValueError:
-                                logger.warning(f"Could not convert year '{year_text}' to int for ad_id: {ad_id}")
-                                year = None
-                        if len(title_spans) > 1:
-                            body_type = title_spans[1].get_text(strip=True)
-
-                    # Extract fuel type, gearbox, engine information, and mileage.
-                    fuel = None
-                    gearbox = None
-                    engine_volume = None
-                    engine_power = None
-                    mileage = None
-                    params_block = listing.find('div', class_='announcement-parameters-block')
-                    if params_block:
-                        block_spans = params_block.find_all('span')
-                        block_spans_values = [s.get_text(strip=True) for s in block_spans]
-
-                        if len(block_spans_values) > 0:
-                            fuel = block_spans_values[0]
-                        if len(block_spans_values) > 1:
-                            gearbox = block_spans_values[1]
-                        if len(block_spans_values) > 2:
-                            engine_info = block_spans_values[2]
-                            if ',' in engine_info:
-                                parts = [p.strip() for p in engine_info.split(',')]
-                                if len(parts) >= 2:
-                                    volume_cleaned = parts[0].replace('l.', '').strip()
-                                    try:
-                                        engine_volume = float(volume_cleaned)
-                                    except ValueError:
-                                        logger.warning(f"Could not convert engine volume '{volume_cleaned}' to float for ad_id: {ad_id}")
-                                        engine_volume = None
-
-                                    power_cleaned = parts[1].replace('kW', '').strip()
-                                    try:
-                                        engine_power = int(power_cleaned)
-                                    except ValueError:
-                                        logger.warning(f"Could not convert engine power '{power_cleaned}' to int for ad_id: {ad_id}")
-                                        engine_power = None
-                            else:
-                                logger.warning(f"Engine info format missing comma for '{engine_info}' for ad_id: {ad_id}")
-                        if len(block_spans_values) > 3:
-                            mileage_text = block_spans_values[3]
-                            if ' km' in mileage_text.lower():
-                                mileage_cleaned = mileage_text.lower().replace('km', '').replace(' ', '').strip()
-                                try:
-                                    mileage = int(mileage_cleaned)
-                                except ValueError:
-                                    logger.warning(f"Could not convert mileage '{mileage_cleaned}' to int for ad_id: {ad_id}")
-                                    mileage = None
-                            else:
-                                logger.warning(f"Mileage format not recognized or 'km' not found for '{mileage_text}' for ad_id: {ad_id}")
-
-                    car_data = (ad_id, make, model, price_value, year, body_type, fuel, gearbox, engine_volume, engine_power, mileage)
-                    insert_car(car_data)
-                    logger.info(f"Successfully inserted car listing (ID: {ad_id}) into DB.")
-                except Exception as e:
-                    logger.error(f"An unexpected error occurred while processing a listing: {e}. Skipping this listing. Ad ID might be missing or unidentifiable.", exc_info=True)
-                    continue
-
-    driver.quit()
+            cars = new_listings(cars, seen_ad_ids)
+            if not cars:
+                logger.info(f"All listings on page {page} for brand '{brand}' are already stored.")
+                continue
+            try:
+                store_listings(cars, brand, page)
+            except sqlite3.Error as e:
+                # Other workers write to the same database; a failed page should not end the whole brand.
+                logger.error(f"Failed to store listings from page {page} for brand '{brand}': {e}")
+                seen_ad_ids.difference_update(car[0] for car in cars)
+    finally:
+        driver.quit()
+
+def scrape_autoplius_with_browser(car_brands: list, pages_per_brand: int, start_page: int):
+    """
+    Scrapes the listing pages through Chrome browsers driven by Selenium.
+    Much slower than plain HTTP, but still works if the site starts requiring JavaScript to render listings.
+    Selenium drivers are not thread-safe, so each brand is scraped in its own worker process with its own browser.
+    """
+    if not car_brands:
+        return
+    max_workers = min(len(car_brands), os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=configure_worker_process) as executor:
+        futures = {
+            executor.submit(scrape_brand, brand, pages_per_brand, start_page, i * BROWSER_START_STAGGER_SECONDS): brand
+            for i, brand in enumerate(car_brands)
+        }
+        # A failing brand is logged on its own, without cancelling the brands still running or queued.
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Scraping brand '{futures[future]}' failed: {e}", exc_info=True)
+
+def scrape_autoplius(car_brands: list, pages_per_brand: int = 1, start_page: int = 1, use_browser: bool = False):
+    """
+    Scrapes car listing data from autoplius.lt for specified car brands and pages.
+
+    Args:
+        car_brands (list): A list of car brand slugs (e.g., ['bmw', 'audi']).
+        pages_per_brand (int): The number of pages to scrape for each brand.
+        start_page (int): The starting page number for scraping.
+        use_browser (bool): Load pages through a Selenium-driven Chrome browser instead of plain HTTP requests.
+    """
+    logger.info("Starting Autoplius.lt scraping process.")
+
+    if use_browser:
+        scrape_autoplius_with_browser(car_brands, pages_per_brand, start_page)
+    else:
+        asyncio.run(scrape_autoplius_async(car_brands, pages_per_brand, start_page))
+
+    refresh_statistics()
     logger.info("Autoplius.lt scraping process completed.")
 
 if __name__ == "__main__":